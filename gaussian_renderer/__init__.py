@@ -197,39 +197,36 @@ def render_lod(viewpoint_cam, lod_list : list, pipe, bg_color : torch.Tensor, sc
     values, lod_indices = torch.max((avg_scalings > nyquist_scalings.unsqueeze(0)).to(torch.uint8), dim=0)
     lod_indices[values==0] = len(lod_list) - 1
     
-    # used for BlockedGaussianV3
-    out_list = []
-    main_device = lod_list[-1].feats.device
+    # used for BlockedGaussianV3, the channel layout is fixed when the LoDs are built
     max_sh_degree = lod_list[-1].max_sh_degree
-    feat_end_dim = 3 * (max_sh_degree + 1) ** 2 + 4
-    
-    for lod_idx, lod_gs in enumerate(lod_list):
-        out_i = lod_gs.get_feats(in_frustum_indices[lod_indices==lod_idx])
-        out_list += out_i
+    compute_cov3D_python = lod_list[-1].compute_cov3D_python
+    point_idxs = [lod_gs.get_point_indices(in_frustum_indices[lod_indices==lod_idx]) for lod_idx, lod_gs in enumerate(lod_list)]
 
-    feats = torch.cat(out_list, dim=0)
+    # channels are gathered on demand, so unused ones are never read
+    def gather_feats(key):
+        return torch.cat([lod_gs.get_feats(point_idx, key) for lod_gs, point_idx in zip(lod_list, point_idxs)], dim=0)
 
-    means3D = feats[:, :3].float()
+    means3D = gather_feats("xyz")
     screenspace_points = torch.zeros_like(means3D, dtype=means3D.dtype, requires_grad=True, device="cuda") + 0
     means2D = screenspace_points
-    opacity = feats[:, 3].float()
+    opacity = gather_feats("opacity")
     # If precomputed 3d covariance is provided, use it. If not, then it will be computed from
     # scaling / rotation by the rasterizer.
     scales = None
     rotations = None
     cov3D_precomp = None
-    if pipe.compute_cov3D_python:
-        cov3D_precomp = feats[:, feat_end_dim:].float()
+    if compute_cov3D_python:
+        cov3D_precomp = gather_feats("cov3D")
     else:
-        scales = feats[:, feat_end_dim:feat_end_dim+3].float()
-        rotations = feats[:, (feat_end_dim+3):].float()
+        scales = gather_feats("scaling")
+        rotations = gather_feats("rotation")
         
     # If precomputed colors are provided, use them. Otherwise, if it is desired to precompute colors
     # from SHs in Python, do it. If not, then SH -> RGB conversion will be done by rasterizer.
     shs = None
     colors_precomp = None
     if override_color is None:
-        features = feats[:, 4:feat_end_dim].reshape(-1, (max_sh_degree+1)**2, 3).float()
+        features = gather_feats("shs").float()
         if pipe.convert_SHs_python:
             shs_view = features.transpose(1, 2).view(-1, 3, (max_sh_degree+1)**2)
             dir_pp = (means3D - viewpoint_cam.camera_center.repeat(features.shape[0], 1))
@@ -21,7 +21,7 @@ from scene import LargeScene
 from os import makedirs
 from gaussian_renderer import render_lod, render
 from utils.general_utils import safe_state
-from utils.large_utils import which_block, block_filtering
+from utils.large_utils import divide_cells, get_cell_point_indices
 from utils.sh_utils import SH2RGB
 from argparse import ArgumentParser
 from arguments import ModelParams, PipelineParams, get_combined_args
@@ -49,8 +49,9 @@ class BlockedGaussian:
         self.max_sh_degree = lp.sh_degree
         self.device = gaussians.get_xyz.device
         self.compute_cov3D_python = compute_cov3D_python
-        self.cell_ids = torch.zeros(gaussians.get_opacity.shape[0], dtype=torch.long, device=self.device)
-        self.mask = torch.zeros(gaussians.get_opacity.shape[0], dtype=torch.bool, device=self.device)
+        self.cell_starts = None
+        self.cell_counts = None
+        self.mask = torch.zeros(gaussians.num_points, dtype=torch.bool, device=self.device)
 
         self.block_dim = lp.block_dim
         self.num_cell = lp.block_dim[0] * lp.block_dim[1] * lp.block_dim[2]
@@ -59,7 +60,9 @@ class BlockedGaussian:
         self.range = range
 
         self.cell_divider(gaussians)
-        self.cell_corners = torch.stack(self.cell_corners, dim=0)
+        # zero-row views returned when nothing is selected, avoiding fresh allocations per frame
+        self.empty_xyz = self.xyz[:0]
+        self.empty_feats = self.feats[:0]
 
     def cell_divider(self, gaussians, n=4):
         with torch.no_grad():
@@ -73,55 +76,45 @@ class BlockedGaussian:
                                     gaussians.get_features.reshape(geometry.shape[0], -1),
                                     geometry], dim=1).half()
             
-            for cell_idx in range(self.num_cell):
-                cell_mask = block_filtering(cell_idx, self.xyz, self.aabb, self.block_dim, self.scale)
-                self.cell_ids[cell_mask] = cell_idx
-                # MAD to eliminate influence of outsiders
-                xyz_median = torch.median(self.xyz[cell_mask], dim=0)[0]
-                delta_median = torch.median(torch.abs(self.xyz[cell_mask] - xyz_median), dim=0)[0]
-                xyz_min = xyz_median - n * delta_median
-                xyz_min = torch.max(xyz_min, torch.min(self.xyz[cell_mask], dim=0)[0])
-                xyz_max = xyz_median + n * delta_median
-                xyz_max = torch.min(xyz_max, torch.max(self.xyz[cell_mask], dim=0)[0])
-                corners = torch.tensor([[xyz_min[0], xyz_min[1], xyz_min[2]],
-                                       [xyz_min[0], xyz_min[1], xyz_max[2]],
-                                       [xyz_min[0], xyz_max[1], xyz_min[2]],
-                                       [xyz_min[0], xyz_max[1], xyz_max[2]],
-                                       [xyz_max[0], xyz_min[1], xyz_min[2]],
-                                       [xyz_max[0], xyz_min[1], xyz_max[2]],
-                                       [xyz_max[0], xyz_max[1], xyz_min[2]],
-                                       [xyz_max[0], xyz_max[1], xyz_max[2]]], device=self.xyz.device)
-                self.cell_corners.append(corners)
+            # sort points by cell so that each cell can be gathered as a contiguous slice
+            sort_idx, _, cell_counts, self.cell_corners = divide_cells(self.xyz, self.aabb, self.block_dim, self.num_cell, n)
+            self.xyz = self.xyz[sort_idx].contiguous()
+            self.feats = self.feats[sort_idx].contiguous()
+            self.cell_counts = cell_counts
+            self.cell_starts = torch.cumsum(cell_counts, dim=0) - cell_counts
     
     def get_feats(self, indices, distances):
-        out_xyz = torch.tensor([], device=self.device, dtype=self.xyz.dtype)
-        out_feats = torch.tensor([], device=self.device, dtype=self.feats.dtype)
+        out_xyz, out_feats = self.empty_xyz, self.empty_feats
         block_mask = (distances >= self.range[0]) & (distances < self.range[1])
         if block_mask.sum() > 0:
-            self.mask = torch.isin(self.cell_ids, indices[block_mask].to(self.device))
-            out_xyz = self.xyz[self.mask]
-            out_feats = self.feats[self.mask]
+            point_idx = get_cell_point_indices(self.cell_starts, self.cell_counts, indices[block_mask])
+            out_xyz = self.xyz.index_select(0, point_idx)
+            out_feats = self.feats.index_select(0, point_idx)
         return out_xyz, out_feats
 
     def get_feats_ptwise(self, viewpoint_cam):
-        out_xyz = torch.tensor([], device=self.device, dtype=self.xyz.dtype)
-        out_feats = torch.tensor([], device=self.device, dtype=self.feats.dtype)
-
-        homo_xyz = torch.cat([self.xyz, torch.ones_like(self.xyz[..., [0]])], dim=-1)
-        cam_center = viewpoint_cam.camera_center
-        viewmatrix = viewpoint_cam.world_view_transform
-        xyz_cam = homo_xyz @ viewmatrix
-        self.mask = (xyz_cam[..., 2] > 0.2)
-        if self.mask.sum() == 0:
-            return out_xyz, out_feats
-
-        distances = torch.norm(self.xyz - cam_center[None, :3], dim=-1)
-        self.mask &= (distances >= self.range[0]) & (distances < self.range[1])
+        out_xyz, out_feats = self.empty_xyz, self.empty_feats
+
+        self.mask = _mask_ptwise(self.xyz, viewpoint_cam.world_view_transform, viewpoint_cam.camera_center,
+                                 float(self.range[0]), float(self.range[1]))
         if self.mask.sum() > 0:
             out_xyz = self.xyz[self.mask]
             out_feats = self.feats[self.mask]
         return out_xyz, out_feats
 
+@torch.jit.script
+def _mask_ptwise(xyz: torch.Tensor, viewmatrix: torch.Tensor, cam_center: torch.Tensor, r0: float, r1: float) -> torch.Tensor:
+    # only depth is needed from the view transform, and squared distances avoid the sqrt,
+    # so the whole test fuses into a single elementwise kernel
+    z_cam = xyz @ viewmatrix[:3, 2] + viewmatrix[3, 2]
+    d2 = ((xyz - cam_center[:3]) ** 2).sum(-1)
+    return (z_cam > 0.2) & (d2 >= r0 * r0) & (d2 < r1 * r1)
+
+@torch.jit.script
+def _to_uint8_hwc(img: torch.Tensor) -> torch.Tensor:
+    # scale, clamp and cast fuse into one elementwise kernel, followed by a single transpose copy
+    return (img * 255).clamp_(0, 255).to(torch.uint8).permute(1, 2, 0).contiguous()
+
 def load_gaussians(cfg, config_name, iteration=30_000, load_vq=False, device='cuda', source_path='data/matrix_city/aerial/test/block_all_test'):
     
     lp, op, pp = parse_cfg(cfg)
@@ -136,7 +129,7 @@ def load_gaussians(cfg, config_name, iteration=30_000, load_vq=False, device='cu
             lp.model_config['kwargs']['apply_voxelize'] = False
         gaussians = getattr(modules, lp.model_config['name'])(lp.sh_degree, device=device, **lp.model_config['kwargs'])
         scene = LargeScene(lp, gaussians, load_iteration=iteration, load_vq=load_vq, shuffle=False)
-        print(f'Init {config_name} with {len(gaussians.get_opacity)} points\n')
+        print(f'Init {config_name} with {gaussians.num_points} points\n')
 
     return gaussians, scene
 
@@ -623,6 +616,12 @@ for t in range(len(interp_xyz)):
 
 angle_list = np_move_avg_v2(np.unwrap(np.array(angle_list), axis=0), 10, mode='same').tolist()
 
+# frames are copied into a small ring of pinned host buffers on a side stream, overlapping
+# with the next render; a slot is moved to pageable memory before it is reused
+num_buffers = 4
+copy_stream = torch.cuda.Stream()
+host_buffers = [None] * num_buffers
+copy_events = [None] * num_buffers
 frames = []
 for t in tqdm(range(len(xyz_list))):
     xyz = xyz_list[t]
@@ -640,11 +639,28 @@ for t in tqdm(range(len(xyz_list))):
     # for matrix city, z_dim=2, otherwise z_dim=1
     viewpoint_cam = loadCamV4(lp, idx, poses[0], 1.0, xyz=xyz, angle=angle)
     img = render(viewpoint_cam, gaussians, pp, background)["render"]
-    img = (img * 255).clamp(0, 255).to(torch.uint8).permute(1, 2, 0).cpu().numpy()
+    img = _to_uint8_hwc(img)
+
+    buffer_idx = t % num_buffers
+    if copy_events[buffer_idx] is not None:
+        copy_events[buffer_idx].synchronize()
+        frames.append(host_buffers[buffer_idx].numpy().copy())
+    if host_buffers[buffer_idx] is None or host_buffers[buffer_idx].shape != img.shape:
+        host_buffers[buffer_idx] = torch.empty(img.shape, dtype=torch.uint8, pin_memory=True)
+    copy_stream.wait_stream(torch.cuda.current_stream())
+    with torch.cuda.stream(copy_stream):
+        host_buffers[buffer_idx].copy_(img, non_blocking=True)
+        copy_events[buffer_idx] = torch.cuda.Event()
+        copy_events[buffer_idx].record(copy_stream)
+    img.record_stream(copy_stream)
 
     # img = np.concatenate([img, bev_map], axis=1)
-    
-    frames.append(img) 
+
+for t in range(max(len(xyz_list) - num_buffers, 0), len(xyz_list)):
+    buffer_idx = t % num_buffers
+    copy_events[buffer_idx].synchronize()
+    frames.append(host_buffers[buffer_idx].numpy().copy())
+del host_buffers
 
 # canvas.draw()
 # buf = canvas.buffer_rgba()
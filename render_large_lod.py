@@ -15,7 +15,7 @@ import yaml
 import json
 import torch
 import torchvision
-import time
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 from arguments import GroupParams
 from scene import LargeScene
@@ -25,7 +25,7 @@ from utils.general_utils import safe_state
 from argparse import ArgumentParser
 from arguments import ModelParams, PipelineParams
 from scene.gaussian_model import GatheredGaussian, BlockedGaussian
-from utils.large_utils import contract_to_unisphere, get_default_aabb
+from utils.large_utils import contract_to_unisphere, get_default_aabb, get_cell_cache_path
 from utils.camera_utils import loadCam
 from utils.general_utils import parse_cfg
 
@@ -33,11 +33,20 @@ def load_gaussians(lp, iteration=30_000, load_vq=False, device='cuda'):
 
     modules = __import__('scene')
     
-    with torch.no_grad():
+    with torch.inference_mode():
         gaussians = getattr(modules, lp.model_config['name'])(lp.sh_degree, device=device, **lp.model_config['kwargs'])
         scene = LargeScene(lp, gaussians, load_iteration=iteration, load_vq=load_vq, shuffle=False)
     return gaussians, scene
 
+def save_staged_image(host_buffer, copy_event, path):
+    copy_event.synchronize()
+    torchvision.utils.save_image(host_buffer, path)
+
+def stage_buffer(host_buffers, buffer_idx, image):
+    if host_buffers[buffer_idx] is None or host_buffers[buffer_idx].shape != image.shape:
+        host_buffers[buffer_idx] = torch.empty(image.shape, dtype=image.dtype, pin_memory=True)
+    return host_buffers[buffer_idx]
+
 def render_set(lp, model_path, name, iteration, views, model, max_sh_degree, pipeline, background):
     avg_render_time = 0
     max_render_time = 0
@@ -51,26 +60,64 @@ def render_set(lp, model_path, name, iteration, views, model, max_sh_degree, pip
     makedirs(render_path, exist_ok=True)
     makedirs(gts_path, exist_ok=True)
 
-    for idx in tqdm(range(len(views)), desc="Rendering progress"):
+    # renderings and ground truths are staged into pinned host buffers on a side stream and
+    # encoded to PNG by a thread pool, so that D2H copies and image writing overlap with rendering
+    # while workers never launch GPU work inside the timed region; a slot is only reused once
+    # the images previously staged in it have been written
+    start_event = torch.cuda.Event(enable_timing=True)
+    end_event = torch.cuda.Event(enable_timing=True)
+    copy_stream = torch.cuda.Stream()
+    num_workers = min(8, os.cpu_count() or 1)
+    render_buffers = [None] * (num_workers + 1)
+    gt_buffers = [None] * (num_workers + 1)
+    save_futures = [[] for _ in range(num_workers + 1)]
+
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        for idx in tqdm(range(len(views)), desc="Rendering progress"):
         
-        viewpoint_cam = loadCam(lp, idx, views[idx], 1.0)
-
-        # gpu_tracker.track() 
-        torch.cuda.reset_peak_memory_stats()
-        torch.cuda.synchronize()
-        start = time.time()
-        rendering = render_lod(viewpoint_cam, model, pipeline, background)["render"]
-        torch.cuda.synchronize()
-        end = time.time()
-        avg_render_time += end-start
-        max_render_time = max(max_render_time, end-start)
-
-        forward_max_memory_allocated = torch.cuda.max_memory_allocated() / (1024.0 ** 2)
-        avg_memory += forward_max_memory_allocated
-        max_memory = max(max_memory, forward_max_memory_allocated)
-        # data saving
-        torchvision.utils.save_image(rendering, os.path.join(render_path, '{0:05d}'.format(idx) + ".png"))
-        torchvision.utils.save_image(viewpoint_cam.original_image[0:3, :, :], os.path.join(gts_path, '{0:05d}'.format(idx) + ".png"))
+            viewpoint_cam = loadCam(lp, idx, views[idx], 1.0)
+
+            # gpu_tracker.track() 
+            torch.cuda.reset_peak_memory_stats()
+            start_event.record()
+            rendering = render_lod(viewpoint_cam, model, pipeline, background)["render"]
+            end_event.record()
+
+            buffer_idx = idx % len(save_futures)
+            for future in save_futures[buffer_idx]:
+                future.result()
+            gt_image = viewpoint_cam.original_image[0:3, :, :]
+            render_buffer = stage_buffer(render_buffers, buffer_idx, rendering)
+            gt_buffer = stage_buffer(gt_buffers, buffer_idx, gt_image)
+            copy_stream.wait_stream(torch.cuda.current_stream())
+            with torch.cuda.stream(copy_stream):
+                render_buffer.copy_(rendering, non_blocking=True)
+                gt_buffer.copy_(gt_image, non_blocking=True)
+                copy_event = torch.cuda.Event()
+                copy_event.record(copy_stream)
+            rendering.record_stream(copy_stream)
+            if gt_image.is_cuda:
+                gt_image.record_stream(copy_stream)
+
+            end_event.synchronize()
+            render_time = start_event.elapsed_time(end_event) / 1000
+            avg_render_time += render_time
+            max_render_time = max(max_render_time, render_time)
+
+            forward_max_memory_allocated = torch.cuda.max_memory_allocated() / (1024.0 ** 2)
+            avg_memory += forward_max_memory_allocated
+            max_memory = max(max_memory, forward_max_memory_allocated)
+            # data saving
+            save_futures[buffer_idx] = [
+                executor.submit(save_staged_image, render_buffer, copy_event, 
+                                os.path.join(render_path, '{0:05d}'.format(idx) + ".png")),
+                executor.submit(save_staged_image, gt_buffer, copy_event, 
+                                os.path.join(gts_path, '{0:05d}'.format(idx) + ".png"))]
+
+    # the executor has joined all workers here, re-raise any error from writing the images
+    for futures in save_futures:
+        for future in futures:
+            future.result()
     
     with open(model_path + "/costs.json", 'w') as fp:
         json.dump({
@@ -87,7 +134,7 @@ def render_set(lp, model_path, name, iteration, views, model, max_sh_degree, pip
 
 def render_sets(dataset : ModelParams, iteration : int, pipeline : PipelineParams, load_vq : bool, skip_train : bool, skip_test : bool, custom_test : bool):
 
-    with torch.no_grad():
+    with torch.inference_mode():
         if dataset.aabb is None:
             import numpy as np
             dataset.aabb = np.load(os.path.join(dataset.source_path, "data_partitions", f"{dataset.partition_name}_aabb.npy")).tolist()
@@ -103,7 +150,9 @@ def render_sets(dataset : ModelParams, iteration : int, pipeline : PipelineParam
             dataset.model_path = dataset.lod_configs[i]
             lod_gs, scene = load_gaussians(dataset, iteration, load_vq)
             print(f"Init LoD {len(dataset.lod_configs)-i} with {lod_gs.get_xyz.shape[0]} points from {dataset.model_path}")
-            lod_gs = BlockedGaussian(lod_gs, dataset, compute_cov3D_python=pp.compute_cov3D_python)
+            cache_iter = f"{scene.loaded_iter}_vq" if load_vq else scene.loaded_iter
+            cache_path = get_cell_cache_path(dataset.model_path, cache_iter, dataset.block_dim, dataset.aabb)
+            lod_gs = BlockedGaussian(lod_gs, dataset, compute_cov3D_python=pp.compute_cov3D_python, cache_path=cache_path)
             lod_gs_list.append(lod_gs)
         dataset.model_path = org_model_path
         
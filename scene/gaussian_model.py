@@ -11,6 +11,7 @@
 import os
 import torch
 import traceback
+from abc import ABC, abstractmethod
 import numpy as np
 from utils.general_utils import inverse_sigmoid, get_expon_lr_func, build_rotation
 from torch import nn
@@ -19,7 +20,7 @@ from utils.system_utils import mkdir_p
 from plyfile import PlyData, PlyElement
 from utils.sh_utils import RGB2SH
 from simple_knn._C import distCUDA2
-from utils.large_utils import block_filtering
+from utils.large_utils import divide_cells, get_cell_point_indices
 from utils.graphics_utils import BasicPointCloud
 from utils.general_utils import strip_symmetric, build_scaling_rotation, build_symmetric
 from utils.vq_utils import load_vqgaussian
@@ -127,6 +128,10 @@ class GaussianModel:
     def get_opacity(self):
         return self.opacity_activation(self._opacity)
     
+    @property
+    def num_points(self):
+        return self._xyz.shape[0]
+    
     def get_covariance(self, scaling_modifier = 1):
         return self.covariance_activation(self.get_scaling, scaling_modifier, self._rotation)
 
@@ -420,19 +425,28 @@ class GaussianModel:
         self.xyz_gradient_accum[update_filter] += torch.norm(viewspace_point_tensor.grad[update_filter,:2], dim=-1, keepdim=True)
         self.denom[update_filter] += 1
 
-class BlockedGaussian:
+class BlockedGaussian(ABC):
 
     gaussians : GaussianModel
+    compute_cov3D_python : bool
+
+    def __new__(cls, gaussians, lp, range=[0, 1], scale=1.0, compute_cov3D_python=None, cache_path=None):
+        # the geometry layout is fixed per run, so the specialized subclass is chosen once here
+        if cls is BlockedGaussian:
+            cls = BlockedGaussianCov if compute_cov3D_python else BlockedGaussianSR
+        return super().__new__(cls)
 
-    def __init__(self, gaussians, lp, range=[0, 1], scale=1.0, compute_cov3D_python=False):
+    def __init__(self, gaussians, lp, range=[0, 1], scale=1.0, compute_cov3D_python=None, cache_path=None):
+        assert compute_cov3D_python is None or bool(compute_cov3D_python) == self.compute_cov3D_python, \
+            f"{type(self).__name__} does not support compute_cov3D_python={compute_cov3D_python}"
         self.cell_corners = []
         self.avg_scalings = []
         self.feats = None
         self.max_sh_degree = lp.sh_degree
         self.device = gaussians.get_xyz.device
-        self.compute_cov3D_python = compute_cov3D_python
-        self.cell_idxs = [0]
-        self.mask = torch.zeros(gaussians.get_opacity.shape[0], dtype=torch.bool, device=self.device)
+        self.cell_starts = None
+        self.cell_counts = None
+        self.mask = torch.zeros(gaussians.num_points, dtype=torch.bool, device=self.device)
 
         self.block_dim = lp.block_dim
         self.num_cell = lp.block_dim[0] * lp.block_dim[1] * lp.block_dim[2]
@@ -440,55 +454,87 @@ class BlockedGaussian:
         self.scale = scale
         self.range = range
 
-        self.cell_divider(gaussians)
-        self.cell_corners = torch.stack(self.cell_corners, dim=0)
+        self.cell_divider(gaussians, cache_path=cache_path)
 
-    def cell_divider(self, gaussians, n=4):
+    def cell_divider(self, gaussians, n=4, cache_path=None):
         with torch.no_grad():
-            if self.compute_cov3D_python:
-                geometry = gaussians.get_covariance(self.scale).to(self.device)
-            else:
-                geometry = torch.cat([gaussians.get_scaling,
-                                      gaussians.get_rotation], dim=1)
-            self.feats = torch.cat([gaussians.get_xyz,
-                                    gaussians.get_opacity,  
-                                    gaussians.get_features.reshape(geometry.shape[0], -1),
-                                    geometry], dim=1)
-
-            xyz = gaussians.get_xyz
-            scaling = gaussians.get_scaling
-            feat_list = []
-            for cell_idx in range(self.num_cell):
-                cell_mask = block_filtering(cell_idx, self.feats[:, :3], self.aabb, self.block_dim, self.scale)
-                self.cell_idxs.append(self.cell_idxs[-1] + cell_mask.sum())
-                feat_list.append(self.feats[cell_mask])
-                # MAD to eliminate influence of outsiders
-                xyz_median = torch.median(xyz[cell_mask], dim=0)[0]
-                delta_median = torch.median(torch.abs(xyz[cell_mask] - xyz_median), dim=0)[0]
-                xyz_min = xyz_median - n * delta_median
-                xyz_min = torch.max(xyz_min, torch.min(xyz[cell_mask], dim=0)[0])
-                xyz_max = xyz_median + n * delta_median
-                xyz_max = torch.min(xyz_max, torch.max(xyz[cell_mask], dim=0)[0])
-                corners = torch.tensor([[xyz_min[0], xyz_min[1], xyz_min[2]],
-                                       [xyz_min[0], xyz_min[1], xyz_max[2]],
-                                       [xyz_min[0], xyz_max[1], xyz_min[2]],
-                                       [xyz_min[0], xyz_max[1], xyz_max[2]],
-                                       [xyz_max[0], xyz_min[1], xyz_min[2]],
-                                       [xyz_max[0], xyz_min[1], xyz_max[2]],
-                                       [xyz_max[0], xyz_max[1], xyz_min[2]],
-                                       [xyz_max[0], xyz_max[1], xyz_max[2]]], device=xyz.device)
-                self.cell_corners.append(corners)
-                self.avg_scalings.append(torch.mean(scaling[cell_mask], dim=0))
-            
-            self.feats = torch.cat(feat_list, dim=0)
-            self.avg_scalings = torch.max(torch.stack(self.avg_scalings, dim=0), dim=-1).values
+            # channels are kept as separate tensors so that each is gathered only if consumed,
+            # SH coefficients dominate the payload and are stored in half precision
+            self.feats = {"xyz": gaussians.get_xyz,
+                          "opacity": gaussians.get_opacity,
+                          "shs": gaussians.get_features.half()}
+            self.feats.update(self.get_geometry(gaussians))
+
+            # cell partition only depends on the checkpoint, so it can be reused across launches;
+            # moments of the positions guard against a retrained checkpoint with the same point count
+            xyz = self.feats["xyz"].double()
+            xyz_checksum = torch.cat([xyz.sum(dim=0), (xyz ** 2).sum(dim=0)])
+            cells = None
+            if cache_path is not None and os.path.exists(cache_path):
+                # any unreadable or mismatching cache is treated as a miss and recomputed
+                try:
+                    cells = torch.load(cache_path, map_location=self.device)
+                    if cells["sort_idx"].shape[0] != xyz.shape[0] or not torch.allclose(cells["xyz_checksum"], xyz_checksum):
+                        cells = None
+                except Exception as e:
+                    print(f"Ignoring unreadable cell partition cache {cache_path}: {e}")
+                    cells = None
+            if cells is None:
+                cells = self.compute_cells(self.feats["xyz"], gaussians.get_scaling, n)
+                cells["xyz_checksum"] = xyz_checksum
+                if cache_path is not None:
+                    # write to a temporary file first, so that a failed write never leaves a partial cache
+                    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+                    try:
+                        torch.save(cells, tmp_path)
+                        os.replace(tmp_path, cache_path)
+                    except (OSError, RuntimeError) as e:
+                        print(f"Failed to cache cell partition to {cache_path}: {e}")
+                        if os.path.exists(tmp_path):
+                            os.remove(tmp_path)
+
+            self.feats = {key: value[cells["sort_idx"]].contiguous() for key, value in self.feats.items()}
+            self.cell_counts = cells["cell_counts"]
+            self.cell_starts = torch.cumsum(self.cell_counts, dim=0) - self.cell_counts
+            self.cell_corners = cells["cell_corners"]
+            self.avg_scalings = cells["avg_scalings"]
+
+    def compute_cells(self, xyz, scaling, n=4):
+        sort_idx, cell_ids, cell_counts, cell_corners = divide_cells(xyz, self.aabb, self.block_dim, self.num_cell, n)
+
+        scatter_idx = cell_ids.long().unsqueeze(-1).expand(-1, 3)
+        cell_stats = torch.zeros((self.num_cell, 3), dtype=scaling.dtype, device=scaling.device)
+        avg_scalings = cell_stats.scatter_reduce(0, scatter_idx, scaling[sort_idx], reduce='mean', include_self=False)
+
+        return {"sort_idx": sort_idx,
+                "cell_counts": cell_counts,
+                "cell_corners": cell_corners,
+                "avg_scalings": torch.max(avg_scalings, dim=-1).values}
     
-    def get_feats(self, indices):
-        out = []
-        if len(indices) > 0:
-            for idx in indices:
-                out.append(self.feats[self.cell_idxs[idx]:self.cell_idxs[idx+1]])
-        return out
+    def get_point_indices(self, indices):
+        return get_cell_point_indices(self.cell_starts, self.cell_counts, indices)
+
+    def get_feats(self, point_idx, key):
+        return self.feats[key].index_select(0, point_idx)
+
+    @abstractmethod
+    def get_geometry(self, gaussians):
+        pass
+
+class BlockedGaussianCov(BlockedGaussian):
+
+    compute_cov3D_python = True
+
+    def get_geometry(self, gaussians):
+        return {"cov3D": gaussians.get_covariance(self.scale).to(self.device)}
+
+class BlockedGaussianSR(BlockedGaussian):
+
+    compute_cov3D_python = False
+
+    def get_geometry(self, gaussians):
+        return {"scaling": gaussians.get_scaling,
+                "rotation": gaussians.get_rotation}
 
 class GaussianModelLOD(GaussianModel):
     def __init__(self, 
@@ -1,4 +1,7 @@
+import os
 import torch
+import hashlib
+import itertools
 import numpy as np
 from utils.camera_utils import loadCam_woImage
 
@@ -98,19 +101,78 @@ def which_block(xyz_org, aabb, block_dim):
 
     return block_id
 
+def get_cell_corners(xyz_min, xyz_max):
+    # corners ordered as (x, y, z) in {min, max}^3, x varying slowest
+    corner_mask = torch.tensor(list(itertools.product([False, True], repeat=3)), device=xyz_min.device)
+    return torch.where(corner_mask[None], xyz_max[:, None], xyz_min[:, None])
+
+def segment_median(values, segment_ids, segment_counts):
+    """Lower median of values[N, D] per segment, for segment_ids sorted in ascending order."""
+    # sort each column by value, then stably by segment, so that within every segment 
+    # the values are ordered and the segments keep the offsets of segment_ids
+    order = torch.argsort(values, dim=0)
+    ids = segment_ids.unsqueeze(-1).expand_as(values).gather(0, order)
+    order = order.gather(0, torch.sort(ids, dim=0, stable=True)[1])
+    sorted_values = values.gather(0, order)
+
+    segment_starts = torch.cumsum(segment_counts, dim=0) - segment_counts
+    median_idx = (segment_starts + (segment_counts - 1).clamp(min=0) // 2).clamp(max=values.shape[0] - 1)
+    medians = sorted_values.gather(0, median_idx.unsqueeze(-1).expand(-1, values.shape[1]))
+    return torch.where((segment_counts > 0).unsqueeze(-1), medians, torch.zeros_like(medians))
+
+def divide_cells(xyz, aabb, block_dim, num_cell, n=4):
+    """Partition points into cells and bound each cell by its points, robust to outliers.
+
+    Returns the permutation that sorts points by cell, the sorted int32 cell ids, the number of
+    points per cell and the [num_cell, 8, 3] corners of every cell.
+    """
+    # assign all points to cells at once, then sort so that each cell is a contiguous slice;
+    # ids are kept in int32 to halve the traffic of the sort, bincount and segment ops,
+    # and only widened where a scatter index is required
+    cell_ids = which_block(xyz, aabb, block_dim).int()
+    sort_idx = torch.argsort(cell_ids)
+    cell_ids = cell_ids[sort_idx]
+    xyz = xyz[sort_idx]
+    cell_counts = torch.bincount(cell_ids, minlength=num_cell)
+
+    scatter_idx = cell_ids.long().unsqueeze(-1).expand(-1, 3)
+    cell_stats = torch.zeros((num_cell, 3), dtype=xyz.dtype, device=xyz.device)
+    xyz_lower = cell_stats.scatter_reduce(0, scatter_idx, xyz, reduce='amin', include_self=False)
+    xyz_upper = cell_stats.scatter_reduce(0, scatter_idx, xyz, reduce='amax', include_self=False)
+
+    # MAD to eliminate influence of outsiders
+    xyz_median = segment_median(xyz, cell_ids, cell_counts)
+    delta_median = segment_median(torch.abs(xyz - xyz_median[cell_ids]), cell_ids, cell_counts)
+    xyz_min = torch.max(xyz_median - n * delta_median, xyz_lower)
+    xyz_max = torch.min(xyz_median + n * delta_median, xyz_upper)
+
+    return sort_idx, cell_ids, cell_counts, get_cell_corners(xyz_min, xyz_max)
+
+def get_cell_point_indices(cell_starts, cell_counts, indices):
+    # flat index of all points in the selected cells, built from their contiguous ranges
+    indices = indices.reshape(-1)
+    counts = cell_counts[indices]
+    offsets = cell_starts[indices] - (torch.cumsum(counts, dim=0) - counts)
+    num_points = int(counts.sum())
+    return torch.arange(num_points, device=cell_counts.device) + torch.repeat_interleave(offsets, counts, output_size=num_points)
+
+def get_cell_cache_path(model_path, iteration, block_dim, aabb, scale=1.0):
+    key = f"{model_path}_{iteration}_{list(block_dim)}_{[round(float(x), 6) for x in aabb]}_{scale}"
+    return os.path.join(model_path, f"blocks_{hashlib.sha256(key.encode()).hexdigest()[:16]}.pt")
+
 def in_frustum(viewpoint_cam, cell_corners, aabb, block_dim):
     num_cell = cell_corners.shape[0]
     device = cell_corners.device
 
-    cell_corners = torch.cat([cell_corners, torch.ones_like(cell_corners[..., [0]])], dim=-1)
-    full_proj_transform = viewpoint_cam.full_proj_transform.repeat(num_cell, 1, 1)
-    viewmatrix = viewpoint_cam.world_view_transform.repeat(num_cell, 1, 1)
-    cell_corners_screen = cell_corners.bmm(full_proj_transform)
+    # apply the transforms as affine maps rather than building homogeneous corners
+    full_proj_transform = viewpoint_cam.full_proj_transform
+    viewmatrix = viewpoint_cam.world_view_transform
+    cell_corners_screen = cell_corners @ full_proj_transform[:3] + full_proj_transform[3]
     cell_corners_screen = cell_corners_screen / cell_corners_screen[..., [-1]]
     cell_corners_screen = cell_corners_screen[..., :-1].reshape(-1, 3)
 
-    cell_corners_cam = cell_corners.bmm(viewmatrix)
-    dist = torch.norm(cell_corners_cam[:, :, :3], dim=-1)
+    cell_corners_cam = cell_corners @ viewmatrix[:3, :3] + viewmatrix[3, :3]
+    dist = torch.norm(cell_corners_cam, dim=-1)
     dist_min = torch.min(dist, dim=-1)[0]
     cam_center_id = torch.argmin(dist_min)
     mask = (cell_corners_cam[..., 2] > 0.2)